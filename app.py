@@ -5,22 +5,215 @@ and generate a comparison table that can be exported as PDF.
 """
 
 import os
+import atexit
+import base64
 import io
-from flask import Flask, render_template, request, send_file
+import json
+import logging
+import mimetypes
+import queue
+import re
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from flask import Flask, render_template, request, send_file, jsonify
 try:
     # Wrap WSGI Flask app so it can run under ASGI servers (uvicorn)
     from asgiref.wsgi import WsgiToAsgi  # type: ignore
 except Exception:  # asgiref may be missing locally
     WsgiToAsgi = None  # type: ignore
+try:
+    # Faster JSON for export payloads; stdlib json is the fallback
+    import orjson as _json  # type: ignore
+except ImportError:  # no wheel for this platform
+    _json = json  # type: ignore
 from datetime import datetime
+
+# Log level for app and parser messages, e.g. LOG_LEVEL=DEBUG (default INFO).
+# Configured before importing the parser so its import-time warnings use it.
+logging.basicConfig(level=logging.getLevelNamesMapping().get(os.getenv('LOG_LEVEL', 'INFO').strip().upper(), logging.INFO),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 from pdf_parser import parse_pdfs
 
-# WeasyPrint availability will be checked at runtime
-WEASYPRINT_AVAILABLE = None
+_log = logging.getLogger(__name__)
+
+# Import WeasyPrint at startup so the first export doesn't pay for it.
+# On Windows, WeasyPrint raises OSError due to missing GTK/Pango libs.
+try:
+    from weasyprint import HTML as _WPHTML, CSS as _WPCSS
+    from weasyprint.text.fonts import FontConfiguration as _WPFontConfiguration
+    # Scanning system fonts is expensive; share one configuration across exports
+    _FONT_CONFIG = _WPFontConfiguration()
+    WEASYPRINT_AVAILABLE = True
+except Exception as _wp_exc:
+    _log.warning("WeasyPrint not available: %s", _wp_exc)
+    _log.warning("PDF export will not be available in local development (Windows). Deploy to Railway for full export.")
+    _WPHTML = _WPCSS = _FONT_CONFIG = None
+    WEASYPRINT_AVAILABLE = False
+
+# PDF export engine: 'weasyprint' (default) or 'chromium' (headless, via Playwright)
+PDF_BACKEND = os.getenv('PDF_BACKEND', 'weasyprint').strip().lower()
+CHROMIUM_AVAILABLE = None
+# Playwright's sync API is bound to the thread that started it, so Chromium
+# work runs on a few long-lived render threads, each owning one browser.
+# Renders are bounded by CHROMIUM_RENDER_TIMEOUT (seconds) per page.
+CHROMIUM_THREADS = 2
+CHROMIUM_RENDER_TIMEOUT = 60
+_CHROMIUM_JOBS: "queue.Queue" = queue.Queue()
+_CHROMIUM_THREADS: list = []
+_CHROMIUM_LOCK = threading.Lock()
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Static images embedded in the exported PDF, pre-encoded as data URIs once
+# so WeasyPrint embeds them reliably without per-request disk reads.
+STATIC_DATA_URIS: dict[str, str] = {}
+for _name in ['strategos_footer.png', 'ana_logo.png', 'atlas_logo.png', 'hdi_logo.png', 'qualitas_logo.png']:
+    _path = os.path.join(app.root_path, 'static', _name)
+    _mime = mimetypes.guess_type(_path)[0] or 'image/png'
+    with open(_path, 'rb') as _f:
+        STATIC_DATA_URIS[_name] = f"data:{_mime};base64,{base64.b64encode(_f.read()).decode('ascii')}"
+
+# Brand detection for header colors/logos: one compiled match per company name
+BRAND_RE = re.compile(r'\b(ANA|HDI|QU[ÁA]LITAS|ATLAS)\b', re.IGNORECASE)
+BRAND_COLOR = {
+    'ANA': '#FE1034',       # ANA red (brand)
+    'HDI': '#006729',       # HDI green (brand)
+    'QUALITAS': '#666678',  # Quálitas gray (brand)
+    'ATLAS': '#D0112B',     # Atlas red (brand)
+}
+BRAND_LOGO = {
+    'ANA': STATIC_DATA_URIS['ana_logo.png'],
+    'HDI': STATIC_DATA_URIS['hdi_logo.png'],
+    'QUALITAS': STATIC_DATA_URIS['qualitas_logo.png'],
+    'ATLAS': STATIC_DATA_URIS['atlas_logo.png'],
+}
+DEFAULT_HEADER_COLOR = '#0b4a6a'
+
+def _brand_of(company: str | None) -> str | None:
+    """Return the normalized brand key (e.g. 'QUALITAS') for a company name."""
+    m = BRAND_RE.search(company or '')
+    return m.group(1).upper().replace('Á', 'A') if m else None
+
+# Characters kept when reading a money string back into a number
+_NUM_RE = re.compile(r"[^0-9.,-]")
+
+def _to_num(s) -> float:
+    """Convert a money string like '$1,234.56' to float (0.0 if invalid)."""
+    if not s:
+        return 0.0
+    try:
+        return float(_NUM_RE.sub("", str(s)).replace(",", ""))
+    except Exception:
+        return 0.0
+
+def _remove_quietly(path: str) -> None:
+    """Delete a temporary export file, ignoring errors."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# Export payloads staged by the results page (and the derived view built by
+# process_files), keyed by an opaque token. Stored as files in a private
+# directory so every server worker process sees them; entries hold client
+# quote data, so the directory is 0700 and files 0600.
+EXPORT_TTL_SECONDS = 600
+EXPORT_CACHE_MAXSIZE = 256
+EXPORT_STORE_DIR = os.getenv('EXPORT_STORE_DIR') or os.path.join(tempfile.gettempdir(), 'segurosautos-exports')
+_TOKEN_RE = re.compile(r'[0-9a-f]{32}')
+
+def _export_path(token: str) -> str | None:
+    """Return the store path for a well-formed token, else None."""
+    if not _TOKEN_RE.fullmatch(token or ''):
+        return None
+    return os.path.join(EXPORT_STORE_DIR, f"{token}.json")
+
+def _ensure_store_dir() -> None:
+    """Create the export store (0700) and refuse one we don't own."""
+    os.makedirs(EXPORT_STORE_DIR, mode=0o700, exist_ok=True)
+    st = os.lstat(EXPORT_STORE_DIR)
+    if not stat.S_ISDIR(st.st_mode):
+        raise RuntimeError(f"Export store {EXPORT_STORE_DIR} is not a directory")
+    if hasattr(os, 'getuid'):
+        if st.st_uid != os.getuid():
+            raise RuntimeError(f"Export store {EXPORT_STORE_DIR} is owned by another user")
+        if st.st_mode & 0o077:
+            os.chmod(EXPORT_STORE_DIR, 0o700)
+
+def _stash_export(payload: dict) -> str:
+    """Store an export payload and return the token that retrieves it."""
+    _ensure_store_dir()
+    # Drop expired entries, then evict oldest if still full
+    now = time.time()
+    entries = []
+    for entry in os.scandir(EXPORT_STORE_DIR):
+        try:
+            mtime = entry.stat().st_mtime
+            if now - mtime > EXPORT_TTL_SECONDS:
+                os.remove(entry.path)
+            else:
+                entries.append((mtime, entry.path))
+        except OSError:
+            continue
+    entries.sort()
+    while len(entries) >= EXPORT_CACHE_MAXSIZE:
+        _remove_quietly(entries.pop(0)[1])
+
+    token = uuid.uuid4().hex
+    path = _export_path(token)
+    data = _json.dumps(payload)
+    fd = os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+    os.replace(path + '.tmp', path)
+    return token
+
+def _read_export(path: str) -> dict | None:
+    """Load a stored payload unless it has expired."""
+    try:
+        if time.time() - os.path.getmtime(path) > EXPORT_TTL_SECONDS:
+            return None
+        with open(path, 'rb') as f:
+            return _json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+def _peek_export(token: str) -> dict | None:
+    """Return the payload for token without consuming it, or None."""
+    path = _export_path(token)
+    return None if path is None else _read_export(path)
+
+def _pop_export(token: str) -> dict | None:
+    """Return and forget the payload for token, or None if unknown/expired.
+
+    The entry is claimed with an atomic rename first, so concurrent requests
+    for the same token (even across workers) get it at most once.
+    """
+    path = _export_path(token)
+    if path is None:
+        return None
+    claimed = f"{path}.{uuid.uuid4().hex}.claimed"
+    try:
+        os.rename(path, claimed)
+    except OSError:
+        return None
+    try:
+        return _read_export(claimed)
+    finally:
+        _remove_quietly(claimed)
+
+def _apply_totals(row: dict) -> None:
+    """Recompute IVA (16%) and Prima Total from the row's premium parts."""
+    subtotal = _to_num(row.get('Prima Neta')) + _to_num(row.get('Recargos')) + _to_num(row.get('Derechos de Póliza'))
+    iva = subtotal * 0.16
+    row['IVA'] = f"${iva:,.2f}"
+    row['Prima Total'] = f"${subtotal + iva:,.2f}"
+
 # Master field list for consistent table structure
 MASTER_FIELDS = [
     'Forma de Pago',
@@ -44,6 +237,85 @@ MASTER_FIELDS = [
     'Prima Total'
 ]
 
+# Values filled in only when the parser didn't provide them
+_ROW_DEFAULTS = {
+    'Asistencia Viajes': 'AMPARADA',
+}
+# Hardcoded values based on example; these apply to all companies
+_ROW_OVERRIDES = {
+    'Atlas Cero Plus por PT de DM': 'AMPARADA',
+    'Accidente al conductor': '$100,000.00',
+    'Deducible - DM': '3%',
+    'Deducible - RT': '5%',
+}
+
+# Stylesheet applied on top of results.html when rendering the PDF export
+_PDF_CSS_TEXT = '''
+    @page {
+        size: A4 portrait;
+        margin: 12mm;
+    }
+    body {
+        font-family: Arial, sans-serif;
+        font-size: 11px;
+        color: #1f2c36;
+    }
+    table {
+        width: 100%;
+        border-collapse: separate;
+        border-spacing: 3px;
+        margin-top: 10px;
+        table-layout: fixed;
+    }
+    th, td {
+        border: 1px solid #cfd8dc;
+        padding: 8px 10px;
+        text-align: left;
+        vertical-align: middle;
+        word-wrap: break-word;
+        background: #ffffff;
+        border-radius: 6px;
+    }
+    th {
+        background: #eef2f6;
+        color: #1f2c36;
+        font-weight: bold;
+    }
+    /* Coverage column cells */
+    td.field-name {
+        background: #0b4a6a;
+        color: #fff;
+        font-weight: 700;
+    }
+    /* Brand highlight for summary rows in PDF as well */
+    td.field-value.summary { color:#fff; font-weight:700; text-align:center; }
+    thead th:first-child { width: 22%; }
+    .logo {
+        max-width: 150px;
+        max-height: 50px;
+    }
+    .export-button {
+        display: none;
+    }
+    .meta {
+        display: flex;
+        justify-content: space-between;
+        align-items: flex-start;
+        gap: 18px;
+        margin: 6px 0 10px 0;
+        color: #4a5961;
+    }
+    .meta .vehiculo { font-weight: 600; color: #0b4a6a; line-height: 1.2; }
+    .meta .vehiculo .vehiculo-name { margin-top: 2px; font-weight: 700; color: #163d52; }
+    th.company-header-cell { text-align: center; }
+    .company-header-inner { display:flex; align-items:center; justify-content:center; height: 100%; width: 100%; }
+    .company-header-inner img { height: 24px; object-fit: contain; margin: 4px auto; display:block; }
+    /* Center values */
+    td.field-value { text-align: center; }
+'''
+# Parsed once at startup rather than on every export
+_PDF_CSS = _WPCSS(string=_PDF_CSS_TEXT, font_config=_FONT_CONFIG) if WEASYPRINT_AVAILABLE else None
+
 @app.route('/')
 def index():
     """Render the main upload page."""
@@ -59,37 +331,42 @@ def process_files():
     
     files = request.files.getlist('files')
     
-    if not files or all(file.filename == '' for file in files):
+    if not files or not any(file.filename for file in files):
         return render_template('index.html', error="No files selected")
     
     parsed_data = []
     errors = []
 
-    # Collect PDF bytes for batch parse
-    contents: list[bytes] = []
-    names: list[str] = []
+    # Reject non-PDF uploads before touching any file contents
+    valid = []
     for file in files:
         if file and file.filename.lower().endswith('.pdf'):
-            try:
-                contents.append(file.read())
-                names.append(file.filename)
-            except Exception as e:
-                errors.append(f"Error reading {file.filename}: {str(e)}")
+            valid.append(file)
         else:
             errors.append(f"Invalid file type: {file.filename}")
 
+    # Read all uploads up front so the batch parse can fan out concurrently
+    items: list[tuple[str, bytes]] = []
+    for file in valid:
+        try:
+            items.append((file.filename, file.read()))
+        except Exception as e:
+            errors.append(f"Error reading {file.filename}: {str(e)}")
+
     # Run batch parse
-    if contents:
+    if items:
         try:
-            results = parse_pdfs(contents)
-            for name, res in zip(names, results):
+            results = parse_pdfs([content for _, content in items])
+            for (name, _), res in zip(items, results):
                 if res:
                     parsed_data.append(res)
                 else:
                     errors.append(f"Could not parse {name}")
         except Exception as e:
+            _log.exception("Batch parsing failed")
             errors.append(f"Batch parsing error: {str(e)}")
     
+    _log.info("Parsed %d of %d uploaded PDFs", len(parsed_data), len(files))
     if not parsed_data:
         return render_template('index.html', error="No valid PDFs could be parsed")
     
@@ -97,52 +374,22 @@ def process_files():
     parsed_data.sort(key=lambda x: x.get('company', ''))
 
     # Global hard-coded overrides/defaults for highlighted rows
+    parsed_data = [{**_ROW_DEFAULTS, **row, **_ROW_OVERRIDES} for row in parsed_data]
+    # Resolve each company's brand once; reused for overrides, colors and export
+    brands = [_brand_of(item.get('company')) for item in parsed_data]
     detected_vehicle = ''
-    for row in parsed_data:
-        # Ensure consistent defaults
-        row.setdefault('Asistencia Viajes', 'AMPARADA')
-        row['Atlas Cero Plus por PT de DM'] = 'AMPARADA'
-        row['Accidente al conductor'] = '$100,000.00'
-        # Hardcoded deductibles and limits based on example
-        # These apply to all companies unless overridden later
-        if 'Daños Materiales' in row and row['Daños Materiales'] and row['Daños Materiales'] != 'N/A':
-            # Keep original limit text; set a standard deductible line
-            row['Deducible - DM'] = '3%'
-        else:
-            row['Deducible - DM'] = '3%'
-
-        if 'Robo Total' in row and row['Robo Total'] and row['Robo Total'] != 'N/A':
-            row['Deducible - RT'] = '5%'
-        else:
-            row['Deducible - RT'] = '5%'
-
+    for row, brand in zip(parsed_data, brands):
         # Atlas-specific coverage present in the example
-        if row.get('company') == 'Seguros Atlas':
+        if brand == 'ATLAS':
             row['Desbielamiento por agua al motor'] = 'AMPARADA'
         # Capture vehicle name if any parser provided it
         if not detected_vehicle and row.get('vehicle_name'):
             detected_vehicle = row.get('vehicle_name')
     
-    # Build header colors for non-export view (used to color summary rows)
-    header_colors: list[str] = []
-    color_map = {
-        'ANA': '#FE1034',
-        'ANA SEGUROS': '#FE1034',
-        'HDI': '#006729',
-        'HDI SEGUROS': '#006729',
-        'QUALITAS': '#666678',
-        'QUÁLITAS': '#666678',
-        'SEGUROS ATLAS': '#D0112B',
-        'ATLAS': '#D0112B'
-    }
-    for item in parsed_data:
-        name = (item.get('company') or '').upper()
-        color_val = '#0b4a6a'
-        for key, c in color_map.items():
-            if key in name:
-                color_val = c
-                break
-        header_colors.append(color_val)
+    # Build header colors (used to color summary rows) and export logos
+    header_colors: list[str] = [BRAND_COLOR.get(b, DEFAULT_HEADER_COLOR) for b in brands]
+    # Keep the derived presentation server-side so export doesn't redo it
+    view_token = _stash_export({'header_colors': header_colors, 'brands': brands})
 
     remaining = 78.0
     num_cols = max(len(parsed_data), 1)
@@ -155,7 +402,8 @@ def process_files():
                          today_str=datetime.now().strftime('%d/%m/%Y'),
                          vehicle_name=detected_vehicle,
                          header_colors=header_colors,
-                         company_col_width=company_col_width)
+                         company_col_width=company_col_width,
+                         view_token=view_token)
 
 @app.route('/export')
 def export_pdf():
@@ -166,223 +414,177 @@ def export_pdf():
     return render_template('index.html', error="Please process files first, then use the export button")
 
 def check_weasyprint_availability():
-    """Check if WeasyPrint is available and cache the result."""
-    global WEASYPRINT_AVAILABLE
-    if WEASYPRINT_AVAILABLE is None:
+    """Return whether WeasyPrint was importable at startup."""
+    return WEASYPRINT_AVAILABLE
+
+def _chromium_call(fn, *args):
+    """Run fn(state, *args) on a Chromium render thread and return its result.
+
+    Raises concurrent.futures.TimeoutError if no result arrives within the
+    render timeout (plus a margin for launching the browser).
+    """
+    with _CHROMIUM_LOCK:
+        while len(_CHROMIUM_THREADS) < CHROMIUM_THREADS:
+            t = threading.Thread(target=_chromium_loop, name=f'chromium-{len(_CHROMIUM_THREADS)}', daemon=True)
+            t.start()
+            _CHROMIUM_THREADS.append(t)
+    future = Future()
+    _CHROMIUM_JOBS.put((future, fn, args))
+    try:
+        return future.result(timeout=CHROMIUM_RENDER_TIMEOUT + 30)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+def _chromium_loop():
+    """Serve Chromium jobs with this thread's browser until shut down."""
+    state = {}
+    try:
+        while True:
+            job = _CHROMIUM_JOBS.get()
+            if job is None:
+                return
+            future, fn, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(state, *args))
+            except BaseException as e:
+                future.set_exception(e)
+    finally:
+        _chromium_stop(state)
+
+def _chromium_browser(state: dict):
+    """Return this render thread's headless Chromium, (re)launching as needed.
+
+    A browser that crashed or disconnected is replaced. Returns None (and
+    the caller falls back to WeasyPrint) when Playwright or Chromium is not
+    installed.
+    """
+    global CHROMIUM_AVAILABLE
+    browser = state.get('browser')
+    if browser is not None and not browser.is_connected():
+        _log.warning("Chromium disconnected; relaunching")
+        _chromium_stop(state)
+        browser = None
+    if browser is None and CHROMIUM_AVAILABLE is not False:
         try:
-            __import__('weasyprint')
-            WEASYPRINT_AVAILABLE = True
+            from playwright.sync_api import sync_playwright
+            state['playwright'] = sync_playwright().start()
+            browser = state['browser'] = state['playwright'].chromium.launch()
+            CHROMIUM_AVAILABLE = True
         except Exception as e:
-            # On Windows, WeasyPrint raises OSError due to missing GTK/Pango libs.
-            print(f"WeasyPrint not available: {e}")
-            print("PDF export will not be available in local development (Windows). Deploy to Railway for full export.")
-            WEASYPRINT_AVAILABLE = False
-    return WEASYPRINT_AVAILABLE
+            _log.warning("Chromium PDF backend not available, falling back to WeasyPrint: %s", e)
+            _chromium_stop(state)
+            CHROMIUM_AVAILABLE = False
+    return browser
+
+def _chromium_pdf(state: dict, html_content: str) -> bytes:
+    """Render html_content to PDF bytes with this thread's browser."""
+    page = _chromium_browser(state).new_page()
+    try:
+        page.set_default_timeout(CHROMIUM_RENDER_TIMEOUT * 1000)
+        page.set_content(html_content)
+        page.add_style_tag(content=_PDF_CSS_TEXT)
+        return page.pdf(format='A4', print_background=True, prefer_css_page_size=True)
+    finally:
+        page.close()
+
+def _chromium_stop(state: dict) -> None:
+    """Close a render thread's browser and stop its Playwright driver."""
+    browser = state.pop('browser', None)
+    playwright = state.pop('playwright', None)
+    try:
+        if browser is not None:
+            browser.close()
+    except Exception:
+        pass
+    finally:
+        if playwright is not None:
+            try:
+                playwright.stop()
+            except Exception:
+                pass
+
+@atexit.register
+def _chromium_shutdown():
+    """Stop the render threads (and their browsers) when the process exits."""
+    threads = [t for t in _CHROMIUM_THREADS if t.is_alive()]
+    for _ in threads:
+        _CHROMIUM_JOBS.put(None)
+    # Bounded: a hung render must not block interpreter exit
+    deadline = time.monotonic() + 5
+    for t in threads:
+        t.join(timeout=max(0.0, deadline - time.monotonic()))
+
+@app.route('/export', methods=['POST'])
+def stage_export():
+    """
+    Store the (possibly edited) comparison sent by the results page and
+    return a short token for the export download link.
+    """
+    try:
+        payload = _json.loads(request.get_data())
+    except ValueError:
+        payload = None
+    # Support both legacy (list) and new {data, meta}
+    if isinstance(payload, list):
+        payload = {'data': payload, 'meta': {}}
+    if not isinstance(payload, dict) or not isinstance(payload.get('data'), list):
+        return jsonify(error="Invalid export payload"), 400
+    # Reuse colors/logos computed by process_files; row order is unchanged
+    view_token = payload.pop('view_token', None)
+    view = _peek_export(view_token) if isinstance(view_token, str) else None
+    if view and len(view.get('header_colors') or []) == len(payload['data']):
+        payload['header_colors'] = view['header_colors']
+        payload['brands'] = view['brands']
+    return jsonify(token=_stash_export(payload))
 
-@app.route('/export/<path:data_json>')
-def export_pdf_with_data(data_json):
+@app.route('/export/<token>')
+def export_pdf_with_data(token):
     """
-    Export PDF with data passed as JSON in URL.
-    This is a workaround for the stateless nature of HTTP.
+    Export PDF for the comparison previously staged under token.
+    Tokens are single-use and expire after EXPORT_TTL_SECONDS.
     """
-    if not check_weasyprint_availability():
+    use_chromium = PDF_BACKEND == 'chromium' and _chromium_call(_chromium_browser) is not None
+    if not use_chromium and not check_weasyprint_availability():
         return "PDF export not available in local development. Please deploy to Railway for full functionality.", 503
     
-    import json
-    import base64
-    from weasyprint import HTML as _HTML, CSS as _CSS
-    from weasyprint.text.fonts import FontConfiguration as _FontConfiguration
-    
+    payload = _pop_export(token)
+    if payload is None:
+        return "Export link expired. Please export again from the results page.", 404
+
     try:
-        # Decode the base64 encoded JSON data
-        # Support base64 generated from browser with UTF-8 characters
-        try:
-            decoded_data = base64.b64decode(data_json).decode('utf-8')
-        except Exception:
-            # Try URL-safe and Latin-1 fallbacks then re-encode to UTF-8
-            decoded_bytes = base64.b64decode(data_json + '==')
-            try:
-                decoded_data = decoded_bytes.decode('utf-8')
-            except UnicodeDecodeError:
-                decoded_data = decoded_bytes.decode('latin-1')
-        payload = json.loads(decoded_data)
-        # Support both legacy (list) and new {data, meta}
-        if isinstance(payload, dict) and 'data' in payload:
-            parsed_data = payload.get('data') or []
-            vehicle_name = (payload.get('meta') or {}).get('vehicle_name', '')
-            date_str = (payload.get('meta') or {}).get('date', datetime.now().strftime('%d/%m/%Y'))
-        else:
-            parsed_data = payload
-            vehicle_name = ''
-            date_str = datetime.now().strftime('%d/%m/%Y')
+        parsed_data = payload.get('data') or []
+        vehicle_name = (payload.get('meta') or {}).get('vehicle_name', '')
+        date_str = (payload.get('meta') or {}).get('date', datetime.now().strftime('%d/%m/%Y'))
         
-        # Sort data alphabetically by company name
-        parsed_data.sort(key=lambda x: x.get('company', ''))
-        
-        # Helper: build data URI for static images so WeasyPrint embeds them reliably
-        import base64
-        import mimetypes
-        def _data_uri(static_filename: str) -> str:
-            file_path = os.path.join(app.root_path, 'static', static_filename)
-            mime = mimetypes.guess_type(file_path)[0] or 'image/png'
-            with open(file_path, 'rb') as f:
-                b64 = base64.b64encode(f.read()).decode('ascii')
-            return f"data:{mime};base64,{b64}"
-
         # Header logo (requested strategos_footer.png at the top)
-        strategos_logo = _data_uri('strategos_footer.png')
-
-        # Company logos map (filenames must exist in /static)
-        logo_map = {
-            'ANA SEGUROS': _data_uri('ana_logo.png'),
-            'ANA': _data_uri('ana_logo.png'),
-            'SEGUROS ATLAS': _data_uri('atlas_logo.png'),
-            'ATLAS': _data_uri('atlas_logo.png'),
-            'HDI SEGUROS': _data_uri('hdi_logo.png'),
-            'HDI': _data_uri('hdi_logo.png'),
-            'QUÁLITAS': _data_uri('qualitas_logo.png'),
-            'QUALITAS': _data_uri('qualitas_logo.png'),
-        }
-        # Build lists aligned with data order
-        company_logos = []
-        header_colors = []
-        color_map = {
-            'ANA': '#FE1034',            # ANA red (brand)
-            'ANA SEGUROS': '#FE1034',
-            'HDI': '#006729',            # HDI green (brand)
-            'HDI SEGUROS': '#006729',
-            'QUALITAS': '#666678',       # Quálitas gray (brand)
-            'QUÁLITAS': '#666678',
-            'SEGUROS ATLAS': '#D0112B',  # Atlas red (brand)
-            'ATLAS': '#D0112B'
-        }
-        for item in parsed_data:
-            name = (item.get('company') or '').upper()
-            # Find a matching key in map
-            logo = None
-            for key, val in logo_map.items():
-                if key in name:
-                    logo = val
-                    break
-            company_logos.append(logo)
-            # Color
-            color_val = '#0b4a6a'
-            for key, c in color_map.items():
-                if key in name:
-                    color_val = c
-                    break
-            header_colors.append(color_val)
+        strategos_logo = STATIC_DATA_URIS['strategos_footer.png']
+
+        brands = payload.get('brands')
+        header_colors = payload.get('header_colors')
+        if brands is None or header_colors is None:
+            # No view from process_files: sort by company name and derive lists
+            parsed_data.sort(key=lambda x: x.get('company', ''))
+            brands = [_brand_of(item.get('company')) for item in parsed_data]
+            header_colors = [BRAND_COLOR.get(b, DEFAULT_HEADER_COLOR) for b in brands]
+        company_logos = [BRAND_LOGO.get(b) for b in brands]
         
-        # Render HTML with export flag
         # Width for company columns (keep 22% for coverages column)
         remaining = 78.0
         num_cols = max(len(parsed_data), 1)
         company_col_width = f"{remaining/num_cols:.2f}%"
 
-        html_content = render_template('results.html',
-                                     data=parsed_data,
-                                     fields=MASTER_FIELDS,
-                                     is_export=True,
-                                     logo_url=strategos_logo,
-                                     company_logos=company_logos,
-                                     header_colors=header_colors,
-                                     company_col_width=company_col_width,
-                                     today_str=date_str,
-                                     vehicle_name=vehicle_name)
-        
-        # Configure fonts for WeasyPrint
-        font_config = _FontConfiguration()
-        
-        # Create PDF with WeasyPrint
-        pdf_buffer = io.BytesIO()
-        
-        # Additional CSS for PDF export
-        pdf_css = _CSS(string='''
-            @page {
-                size: A4 portrait;
-                margin: 12mm;
-            }
-            body {
-                font-family: Arial, sans-serif;
-                font-size: 11px;
-                color: #1f2c36;
-            }
-            table {
-                width: 100%;
-                border-collapse: separate;
-                border-spacing: 3px;
-                margin-top: 10px;
-                table-layout: fixed;
-            }
-            th, td {
-                border: 1px solid #cfd8dc;
-                padding: 8px 10px;
-                text-align: left;
-                vertical-align: middle;
-                word-wrap: break-word;
-                background: #ffffff;
-                border-radius: 6px;
-            }
-            th {
-                background: #eef2f6;
-                color: #1f2c36;
-                font-weight: bold;
-            }
-            /* Coverage column cells */
-            td.field-name {
-                background: #0b4a6a;
-                color: #fff;
-                font-weight: 700;
-            }
-            /* Brand highlight for summary rows in PDF as well */
-            td.field-value.summary { color:#fff; font-weight:700; text-align:center; }
-            thead th:first-child { width: 22%; }
-            .logo {
-                max-width: 150px;
-                max-height: 50px;
-            }
-            .export-button {
-                display: none;
-            }
-            .meta {
-                display: flex;
-                justify-content: space-between;
-                align-items: flex-start;
-                gap: 18px;
-                margin: 6px 0 10px 0;
-                color: #4a5961;
-            }
-            .meta .vehiculo { font-weight: 600; color: #0b4a6a; line-height: 1.2; }
-            .meta .vehiculo .vehiculo-name { margin-top: 2px; font-weight: 700; color: #163d52; }
-            th.company-header-cell { text-align: center; }
-            .company-header-inner { display:flex; align-items:center; justify-content:center; height: 100%; width: 100%; }
-            .company-header-inner img { height: 24px; object-fit: contain; margin: 4px auto; display:block; }
-            /* Center values */
-            td.field-value { text-align: center; }
-        ''', font_config=font_config)
-        
-        # Server-side safety: recompute IVA and Prima Total in case client didn't
+        # Server-side safety: always recompute IVA and Prima Total; the
+        # client-side recompute may have failed or been skipped
         try:
             for item in parsed_data:
-                def to_num(s: str) -> float:
-                    import re
-                    if not s:
-                        return 0.0
-                    n = re.sub(r"[^0-9.,-]", "", str(s)).replace(",", "")
-                    try:
-                        return float(n)
-                    except Exception:
-                        return 0.0
-                pn = to_num(item.get('Prima Neta'))
-                rec = to_num(item.get('Recargos'))
-                der = to_num(item.get('Derechos de Póliza'))
-                iva = (pn + rec + der) * 0.16
-                total = pn + rec + der + iva
-                item['IVA'] = f"${iva:,.2f}"
-                item['Prima Total'] = f"${total:,.2f}"
+                _apply_totals(item)
         except Exception:
             pass
 
+        # Render HTML with export flag (once, after the financial recompute)
         html_content = render_template('results.html',
                                      data=parsed_data,
                                      fields=MASTER_FIELDS,
@@ -394,14 +596,22 @@ def export_pdf_with_data(data_json):
                                      today_str=date_str,
                                      vehicle_name=vehicle_name)
 
-        _HTML(string=html_content).write_pdf(pdf_buffer, stylesheets=[pdf_css], font_config=font_config)
-        
-        pdf_buffer.seek(0)
-        
-        return send_file(pdf_buffer, 
-                       as_attachment=True, 
-                       download_name='comparison.pdf',
-                       mimetype='application/pdf')
+        # Render straight to bytes: no temp file or open handle can be left
+        # behind, however the server ends the response
+        if use_chromium:
+            pdf_bytes = _chromium_call(_chromium_pdf, html_content)
+        else:
+            pdf_bytes = _WPHTML(string=html_content).write_pdf(stylesheets=[_PDF_CSS], font_config=_FONT_CONFIG)
+
+        response = send_file(io.BytesIO(pdf_bytes),
+                             as_attachment=True,
+                             download_name='comparison.pdf',
+                             mimetype='application/pdf',
+                             max_age=0,
+                             conditional=False)
+        # Exports contain client data and are single-use; never cache them
+        response.headers['Cache-Control'] = 'no-store'
+        return response
         
     except Exception as e:
         return f"Error generating PDF: {str(e)}", 500
@@ -0,0 +1,25 @@
+"""
+Gunicorn settings for production (Railway / Docker).
+Runs the ASGI app under uvicorn workers:
+
+    gunicorn -c gunicorn.conf.py app:asgi_app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# Import app.py (WeasyPrint, fonts, export CSS, logos) once in the master so
+# forked workers share it copy-on-write instead of each re-importing it
+preload_app = True
+
+# Two workers by default so PDF exports can render in parallel. Each worker
+# holds its own WeasyPrint/font state (and optional Chromium), so memory grows
+# roughly linearly with workers, as does ADE concurrency (workers x
+# PDF_CONCURRENCY). os.cpu_count() reports host CPUs inside containers, so it
+# is not used; set WEB_CONCURRENCY to match the container's memory/CPU quota.
+workers = int(os.environ.get('WEB_CONCURRENCY') or 2)
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+# PDF rendering and ADE extraction can take a while
+timeout = 120
@@ -2,15 +2,132 @@
 PDF parsing module using Landing AI ADE unified schema for insurance quotations.
 """
 
+import io
 import os
+import math
+import logging
+import re
 import json
+import hashlib
+import threading
+import time
+import importlib.util
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Dict, Optional, List, Any, Iterable
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+try:
+    # Faster JSON for ADE responses; stdlib json is the fallback
+    import orjson as _json  # type: ignore
+except ImportError:  # no wheel for this platform
+    _json = json  # type: ignore
+try:
+    # Streams multipart uploads instead of building the whole body in memory
+    from requests_toolbelt import MultipartEncoder  # type: ignore
+except ImportError:
+    MultipartEncoder = None  # type: ignore
+_log = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment; invalid values log and use default."""
+    raw = (os.getenv(name) or "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        _log.warning("Ignoring invalid %s=%r; using %d", name, raw, default)
+        return default
+
+
+# Failures parse_pdf reports as None; anything else is a bug and propagates
+_PARSE_ERRORS: tuple = (RuntimeError, ValueError, requests.RequestException)
+
+# Currency-looking amount, e.g. "$ 1,234.56"
+_AMOUNT_RE = re.compile(r'\$?\s*([0-9]{1,3}(?:,[0-9]{3})*(?:\.[0-9]{2})?)')
+
+# Characters dropped from amounts before float(): currency sign, thousands
+# separators and whitespace
+_NUM_TRANS = str.maketrans('', '', '$, \t\n\r')
+
+# Coverage rows read from ADE coverages[]: (result key, name substrings, show deductible)
+_COVERAGE_SPECS = (
+    ("Daños Materiales", ("DAÑOS MATERIALES", "DANOS MATERIALES"), True),
+    ("Robo Total", ("ROBO TOTAL",), True),
+    ("Responsabilidad Civil", ("RESPONSABILIDAD CIVIL",), False),
+    ("Gastos Medicos Ocupantes", ("GASTOS MEDICOS", "GASTOS MÉDICOS"), False),
+)
+
+def _load_schema_json() -> tuple:
+    """Read schema.json (project root) once and serialize it for the ADE form field."""
+    schema_path = os.path.join(os.path.dirname(__file__), 'schema.json')
+    try:
+        with open(schema_path, "r", encoding="utf-8") as f:
+            schema: Dict[str, Any] = json.load(f)
+        serialized = _json.dumps(schema)
+        return (serialized.decode("utf-8") if isinstance(serialized, bytes) else serialized), None
+    except Exception as exc:
+        return None, exc
+
+# Serialized extraction schema (None plus the error if schema.json is unreadable)
+_SCHEMA_JSON_STR, _SCHEMA_ERROR = _load_schema_json()
+# Top-level fields a complete extraction must contain
+_SCHEMA_REQUIRED = tuple(_json.loads(_SCHEMA_JSON_STR).get("required") or ()) if _SCHEMA_JSON_STR else ()
+
+# Parsed results keyed by PDF content digest, so re-uploads skip the ADE call
+PARSE_CACHE_MAXSIZE = 256
+_PARSE_CACHE: "OrderedDict[bytes, Dict[str, str]]" = OrderedDict()
+_PARSE_CACHE_LOCK = threading.Lock()
+
+# Worker pool shared across requests for batch parsing (created lazily).
+# ADE calls are network-bound, so size for concurrent uploads, not CPUs;
+# PDF_CONCURRENCY lets deployments match their Landing AI rate limit. The
+# pool is per process, so each gunicorn worker gets its own: total ADE
+# concurrency is WEB_CONCURRENCY x PDF_CONCURRENCY.
+PARSE_MAX_WORKERS = max(1, _env_int("PDF_CONCURRENCY", 8))
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+# Upload only the first N pages to ADE (0 = send the whole document).
+# PyMuPDF is imported on first use, so it is never loaded when this is off.
+ADE_MAX_PAGES = _env_int("ADE_MAX_PAGES", 0)
+if ADE_MAX_PAGES > 0 and importlib.util.find_spec("pymupdf") is None:
+    _log.warning("ADE_MAX_PAGES=%d is set but PyMuPDF is not installed; PDFs will be uploaded whole",
+                 ADE_MAX_PAGES)
+
+# Optional on-disk cache of raw ADE responses, shared across workers and
+# restarts (unset = disabled). Keyed by PDF bytes, schema and endpoint.
+EXTRACTION_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR") or None
+
+if not os.environ.get("LANDING_AI_API_KEY"):
+    _log.warning("LANDING_AI_API_KEY is not set; PDF parsing will fail until it is")
+
+# ADE attempts per document: throttled/unavailable responses and extractions
+# missing required fields are retried with linear backoff (1s, 2s, ...).
+# A retry is only started if a full request still fits ADE_TOTAL_TIMEOUT, which
+# stays under gunicorn's 120s worker timeout. Read timeouts are not retried:
+# they raise out of the loop and fail the document.
+ADE_MAX_ATTEMPTS = max(1, _env_int("ADE_MAX_ATTEMPTS", 2))
+ADE_RETRY_BACKOFF = 1.0
+ADE_REQUEST_TIMEOUT = 60
+ADE_TOTAL_TIMEOUT = 100
+_ADE_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# Keep-alive HTTP session for ADE, sized to cover the worker pool.
+# Only failed connects are retried here: the streamed upload body cannot be
+# replayed, so status retries rebuild the request (see ADE_MAX_ATTEMPTS).
+_ADE_RETRY = Retry(total=3, connect=3, read=0, status=0, other=0, backoff_factor=0.3)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=_ADE_RETRY))
+_SESSION.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=_ADE_RETRY))
 
 def _first_amount(text: str) -> Optional[str]:
     """Return first currency-looking amount in text. Kept for compatibility."""
-    import re
-    m = re.search(r'\$?\s*([0-9]{1,3}(?:,[0-9]{3})*(?:\.[0-9]{2})?)', text)
+    m = _AMOUNT_RE.search(text)
     return m.group(1) if m else None
 
 def _to_number(amount: Optional[str]) -> Optional[float]:
@@ -18,17 +135,22 @@ def _to_number(amount: Optional[str]) -> Optional[float]:
     if not amount:
         return None
     try:
-        s = str(amount).strip().replace('$', '').replace(',', '').replace(' ', '')
-        return float(s)
+        return float(str(amount).translate(_NUM_TRANS))
     except Exception:
         return None
 
-def _format_currency(value: float) -> str:
-    """Format float as currency string with thousands and two decimals (no symbol)."""
-    try:
-        return f"{value:,.2f}"
-    except Exception:
-        return str(value)
+def _to_cents(amount: Optional[str]) -> Optional[int]:
+    """Convert amount string to integer cents. Returns None if invalid."""
+    num = _to_number(amount)
+    # 'inf'/'nan'/'1e400' parse as floats but have no cent value
+    if num is None or not math.isfinite(num):
+        return None
+    return int(round(num * 100))
+
+def _format_cents(cents: int) -> str:
+    """Format integer cents as '$1,234.56'."""
+    pesos, cts = divmod(abs(cents), 100)
+    return f"{'-' if cents < 0 else ''}${pesos:,}.{cts:02d}"
 
 def _compute_financials(prima_neta_raw: Optional[str], prima_total_raw: Optional[str],
                         recargos_raw: Optional[str], derechos_raw: Optional[str],
@@ -36,37 +158,42 @@ def _compute_financials(prima_neta_raw: Optional[str], prima_total_raw: Optional
     """Standardized computation for Prima Neta, Recargos, Derechos, IVA and Prima Total.
     - Prefer provided Prima Neta if > threshold; fallback to Prima Total if > threshold.
     - Recargos above cap are treated as 0.
-    - IVA = (neta + recargos + derechos) * 0.16
+    - IVA = (neta + recargos + derechos) * 0.16, rounded half-up to the cent
     - Prima Total = neta + recargos + derechos + IVA
+    All arithmetic is done in integer cents so totals reconcile exactly.
     Returns formatted strings with '$'.
     """
-    prima_neta_num = _to_number(prima_neta_raw)
-    prima_total_num = _to_number(prima_total_raw)
+    return _compute_financials_cents(
+        _to_cents(prima_neta_raw), _to_cents(prima_total_raw),
+        _to_cents(recargos_raw) or 0, _to_cents(derechos_raw) or 0,
+        int(round(recargos_cap * 100)), int(round(min_total_threshold * 100)),
+    )
+
+def _compute_financials_cents(prima_neta: Optional[int], prima_total: Optional[int],
+                              rec: int, der: int,
+                              cap_cents: int = 200000, threshold_cents: int = 100000) -> Dict[str, str]:
+    """Arithmetic core of _compute_financials on already-parsed integer cents."""
     # Choose valid prima_neta
-    chosen_neta = None
-    if prima_neta_num is not None and prima_neta_num > min_total_threshold:
-        chosen_neta = prima_neta_num
-    elif prima_total_num is not None and prima_total_num > min_total_threshold:
-        chosen_neta = prima_total_num
+    if prima_neta is not None and prima_neta > threshold_cents:
+        neta = prima_neta
+    elif prima_total is not None and prima_total > threshold_cents:
+        neta = prima_total
     else:
-        chosen_neta = 0.0
+        neta = 0
     # Recargos
-    rec_num = _to_number(recargos_raw) or 0.0
-    if rec_num > recargos_cap:
-        rec_num = 0.0
-    # Derechos
-    der_num = _to_number(derechos_raw) or 0.0
+    if rec > cap_cents:
+        rec = 0
     # IVA and total
-    iva_num = (chosen_neta + rec_num + der_num) * 0.16
-    total_num = chosen_neta + rec_num + der_num + iva_num
-    result = {
-        'Prima Neta': f"${_format_currency(chosen_neta)}" if chosen_neta > 0 else 'N/A',
-        'Recargos': f"${_format_currency(rec_num)}" if rec_num > 0 else '$ 0',
-        'Derechos de Póliza': f"${_format_currency(der_num)}" if der_num > 0 else 'N/A',
-        'IVA': f"${_format_currency(iva_num)}",
-        'Prima Total': f"${_format_currency(total_num)}" if total_num > 0 else 'N/A',
+    subtotal = neta + rec + der
+    iva = (subtotal * 16 + 50) // 100
+    total = subtotal + iva
+    return {
+        'Prima Neta': _format_cents(neta) if neta > 0 else 'N/A',
+        'Recargos': _format_cents(rec) if rec > 0 else '$ 0',
+        'Derechos de Póliza': _format_cents(der) if der > 0 else 'N/A',
+        'IVA': _format_cents(iva),
+        'Prima Total': _format_cents(total) if total > 0 else 'N/A',
     }
-    return result
 
 
 def parse_pdf(pdf_content: bytes) -> Optional[Dict[str, str]]:
@@ -78,22 +205,80 @@ def parse_pdf(pdf_content: bytes) -> Optional[Dict[str, str]]:
         
     Returns:
         Dictionary with extracted insurance data or None if parsing fails
+
+    Complete results are cached by content digest; failures and extractions
+    missing required fields are not, so they are retried on re-upload.
     """
+    key = _content_key(pdf_content)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
     try:
         ade_data = _ade_extract_unified(pdf_content)
         if not ade_data:
             return None
-        return _map_ade_to_result(ade_data)
-    except Exception as e:
-        print(f"Error parsing PDF: {str(e)}")
+        result = _map_ade_to_result(ade_data)
+    except _PARSE_ERRORS:
+        _log.exception("Error parsing PDF")
         return None
+    if _ade_complete(ade_data):
+        _cache_put(key, result)
+    return result
+
+
+def _content_key(pdf_content: bytes) -> bytes:
+    """Cache key for PDF bytes (SHA-256 is hardware-accelerated via OpenSSL)."""
+    return hashlib.sha256(pdf_content).digest()
+
+
+def _cache_get(key: bytes) -> Optional[Dict[str, str]]:
+    """Return a copy of the cached result for key, if any."""
+    with _PARSE_CACHE_LOCK:
+        cached = _PARSE_CACHE.get(key)
+        if cached is None:
+            return None
+        _PARSE_CACHE.move_to_end(key)
+        return dict(cached)
+
+
+def _cache_put(key: bytes, result: Dict[str, str]) -> None:
+    """Store a copy of result, evicting the least recently used entries."""
+    with _PARSE_CACHE_LOCK:
+        _PARSE_CACHE[key] = dict(result)
+        while len(_PARSE_CACHE) > PARSE_CACHE_MAXSIZE:
+            _PARSE_CACHE.popitem(last=False)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return the shared batch-parsing pool, creating it on first use."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(max_workers=PARSE_MAX_WORKERS,
+                                               thread_name_prefix="parse_pdf")
+    return _EXECUTOR
 
 
 def parse_pdfs(pdf_contents: Iterable[bytes]) -> List[Optional[Dict[str, str]]]:
-    """Batch parse helper using ADE; sequential calls for 1-2 page PDFs."""
+    """Batch parse helper using ADE; fans out over a shared worker pool.
+
+    Results are returned in the same order as the inputs.
+    """
+    contents = list(pdf_contents)
+    if len(contents) > 1:
+        executor = _get_executor()
+        calls = [executor.submit(parse_pdf, content).result for content in contents]
+    else:
+        calls = [partial(parse_pdf, content) for content in contents]
+    # Any failure, even one parse_pdf does not expect, only voids its own slot
     results: List[Optional[Dict[str, str]]] = []
-    for content in pdf_contents:
-        results.append(parse_pdf(content))
+    for call in calls:
+        try:
+            results.append(call())
+        except Exception:
+            _log.exception("Error parsing PDF")
+            results.append(None)
     return results
 
 
@@ -104,56 +289,175 @@ def _ade_extract_unified(pdf_content: bytes) -> Optional[Dict[str, Any]]:
     - LANDING_AI_API_KEY: VA API key (Basic auth)
     - LANDING_AI_ADE_URL: Full endpoint URL (defaults to Landing AI ADE endpoint)
       Default: https://api.va.landing.ai/v1/tools/agentic-document-analysis
-    The extraction schema is always loaded from a local 'schema.json'.
+    The extraction schema is always the local 'schema.json', loaded at import.
+    """
+    endpoint, headers, data = _ade_request_args()
+    cache_path = _disk_cache_path(pdf_content, endpoint)
+    cached = _disk_cache_load(cache_path)
+    if cached is not None:
+        return cached
+    pdf_content = _trim_pdf(pdf_content)
+    payload = None
+    deadline = time.monotonic() + ADE_TOTAL_TIMEOUT
+    for attempt in range(ADE_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(ADE_RETRY_BACKOFF * attempt)
+        resp = _ade_post(endpoint, headers, data, pdf_content)
+        can_retry = (attempt + 1 < ADE_MAX_ATTEMPTS and time.monotonic()
+                     + ADE_RETRY_BACKOFF * (attempt + 1) + ADE_REQUEST_TIMEOUT <= deadline)
+        if resp.status_code in _ADE_RETRY_STATUSES and can_retry:
+            continue
+        payload = _ade_handle_response(resp)
+        if _ade_complete(payload):
+            _disk_cache_store(cache_path, payload)
+            break
+        if not can_retry:
+            break
+    return payload
+
+
+def _ade_post(endpoint: str, headers: Dict[str, str], data: Dict[str, str], pdf_content: bytes) -> Any:
+    """Send one ADE extraction request through the pooled session."""
+    # ADE expects either 'document' (file upload) or 'document_url'. Use file upload.
+    if MultipartEncoder is not None:
+        body = MultipartEncoder(fields={
+            **data,
+            "document": ("document.pdf", io.BytesIO(pdf_content), "application/pdf"),
+        })
+        return _SESSION.post(endpoint, headers={**headers, "Content-Type": body.content_type},
+                             data=body, timeout=ADE_REQUEST_TIMEOUT)
+    files = {"document": ("document.pdf", pdf_content, "application/pdf")}
+    return _SESSION.post(endpoint, headers=headers, files=files, data=data, timeout=ADE_REQUEST_TIMEOUT)
+
+
+def _ade_complete(ade: Optional[Dict[str, Any]]) -> bool:
+    """True if an ADE response has every required top-level schema field."""
+    if not isinstance(ade, dict):
+        return False
+    fields = _ade_fields(ade)
+    return isinstance(fields, dict) and all(fields.get(k) not in (None, "", [], {}) for k in _SCHEMA_REQUIRED)
+
+
+def _disk_cache_path(pdf_content: bytes, endpoint: str) -> Optional[str]:
+    """Path of the on-disk ADE cache entry for a document, or None if disabled."""
+    if not EXTRACTION_CACHE_DIR:
+        return None
+    # Length-prefix the PDF so the trailing settings cannot alias its bytes
+    h = hashlib.sha256(len(pdf_content).to_bytes(8, "big"))
+    h.update(pdf_content)
+    h.update(f"\0{endpoint}\0{ADE_MAX_PAGES}\0{_SCHEMA_JSON_STR}".encode("utf-8"))
+    return os.path.join(EXTRACTION_CACHE_DIR, h.hexdigest() + ".json")
+
+
+def _disk_cache_load(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Return a cached ADE response, or None on a miss or unreadable entry."""
+    if path is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return _json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _disk_cache_store(path: Optional[str], payload: Optional[Dict[str, Any]]) -> None:
+    """Atomically write an ADE response to the on-disk cache (best effort)."""
+    if path is None or not payload:
+        return
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = _json.dumps(payload)
+        with open(tmp, "wb") as f:
+            f.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+        os.replace(tmp, path)
+    except (OSError, TypeError):
+        _log.warning("Could not write extraction cache entry %s", path, exc_info=True)
+
+
+def _trim_pdf(pdf_content: bytes) -> bytes:
+    """Keep only the first ADE_MAX_PAGES pages of the PDF, if configured.
+
+    Returns the original bytes when trimming is disabled, PyMuPDF is missing,
+    the document is already short enough, or it cannot be opened locally.
     """
+    if ADE_MAX_PAGES <= 0:
+        return pdf_content
+    try:
+        import pymupdf  # type: ignore
+    except ImportError:
+        return pdf_content
+    try:
+        with pymupdf.open(stream=pdf_content, filetype="pdf") as doc:
+            if doc.page_count <= ADE_MAX_PAGES:
+                return pdf_content
+            doc.select(list(range(ADE_MAX_PAGES)))
+            return doc.tobytes(garbage=4, deflate=True)
+    except Exception:
+        _log.warning("Could not trim PDF; uploading it whole", exc_info=True)
+        return pdf_content
+
+
+def _ade_request_args() -> tuple:
+    """Return (endpoint, headers, form data) for an ADE extraction request."""
     api_key = os.environ.get("LANDING_AI_API_KEY")
     endpoint = os.environ.get("LANDING_AI_ADE_URL") or "https://api.va.landing.ai/v1/tools/agentic-document-analysis"
 
     if not api_key:
         raise RuntimeError("Missing LANDING_AI_API_KEY in environment")
-    # Always load schema from local schema.json (project root)
-    schema_path = os.path.join(os.path.dirname(__file__), 'schema.json')
-    try:
-        with open(schema_path, "r", encoding="utf-8") as f:
-            schema: Dict[str, Any] = json.load(f)
-    except Exception as exc:
-        raise RuntimeError(f"Failed to read schema.json: {exc}")
+    if _SCHEMA_JSON_STR is None:
+        raise RuntimeError(f"Failed to read schema.json: {_SCHEMA_ERROR}")
 
     headers = {"Authorization": f"Basic {api_key}"}
+    data = {"fields_schema": _SCHEMA_JSON_STR}
+    return endpoint, headers, data
 
-    # ADE expects either 'document' (file upload) or 'document_url'. Use file upload.
-    files = {"document": ("document.pdf", pdf_content, "application/pdf")}
-    data = {"fields_schema": json.dumps(schema)}
 
-    resp = requests.post(endpoint, headers=headers, files=files, data=data, timeout=60)
+def _ade_handle_response(resp: Any) -> Optional[Dict[str, Any]]:
+    """Decode an ADE response into a JSON dict."""
     if resp.status_code >= 400:
         raise RuntimeError(f"ADE request failed: {resp.status_code} {resp.text[:240]}")
     try:
-        return resp.json()
-    except Exception:
+        payload = _json.loads(resp.content)
+    except Exception as exc:
+        raise RuntimeError(f"Invalid ADE JSON response: {exc}")
+    if isinstance(payload, str):
         # Attempt to parse text to JSON if response is stringified
         try:
-            return json.loads(resp.text)
+            payload = _json.loads(payload)
         except Exception as exc:
             raise RuntimeError(f"Invalid ADE JSON response: {exc}")
+    if payload is not None and not isinstance(payload, dict):
+        raise RuntimeError(f"Unexpected ADE response type: {type(payload).__name__}")
+    return payload
 
 
-def _map_ade_to_result(ade: Dict[str, Any]) -> Dict[str, str]:
-    """Map ADE unified response to app's expected keys and compute financials."""
+def _ade_fields(ade: Dict[str, Any]) -> Any:
+    """Return the extracted fields from an ADE response."""
     # ADE API shape: { data: { extracted_schema: {...} } }
     container = ade.get("data") or ade
     if isinstance(container, dict) and "extracted_schema" in container:
-        fields = container.get("extracted_schema") or {}
-    else:
-        # Fallbacks for other shapes
-        fields = ade.get("fields") or container or ade
+        return container.get("extracted_schema") or {}
+    # Fallbacks for other shapes
+    return ade.get("fields") or container or ade
+
+
+def _map_ade_to_result(ade: Dict[str, Any]) -> Dict[str, str]:
+    """Map ADE unified response to app's expected keys and compute financials."""
+    fields = _ade_fields(ade)
+
+    # Snapshot of non-empty fields with {"value": ...} wrappers unwrapped once
+    flat: Dict[str, Any] = {}
+    if isinstance(fields, dict):
+        for k, v in fields.items():
+            if v is None or v == "":
+                continue
+            flat[k] = (v.get("value") or "") if isinstance(v, dict) and "value" in v else v
 
     def get_field(*names: str) -> Optional[str]:
         for n in names:
-            if n in fields and fields[n] not in (None, ""):
-                v = fields[n]
-                if isinstance(v, dict) and "value" in v:
-                    return str(v.get("value") or "").strip()
+            v = flat.get(n)
+            if v is not None:
                 return str(v).strip()
         return None
 
@@ -192,10 +496,6 @@ def _map_ade_to_result(ade: Dict[str, Any]) -> Dict[str, str]:
     fin = _compute_financials(prima_neta_raw, prima_total_raw, recargos_raw, derechos_raw)
 
     # Coverages: map from coverages[] list when available; fallback to flat keys
-    danos_materiales = "N/A"
-    robo_total = "N/A"
-    responsabilidad_civil = "N/A"
-    gmo = "N/A"
     asistencia_legal = get_field("asistencia_legal", "gastos_legales", "asistencia_juridica") or "N/A"
     asistencia_viajes = get_field("asistencia_viajes", "asistencia_vial", "asistencia_en_viajes") or "N/A"
     acc_conductor = get_field("accidente_conductor", "accidente_al_conductor", "muerte_conductor")
@@ -207,49 +507,29 @@ def _map_ade_to_result(ade: Dict[str, Any]) -> Dict[str, str]:
     coverages = []
     if isinstance(fields, dict):
         coverages = fields.get("coverages") or []
-    # Helper to find coverage by name
-    def cov_by_name(names: List[str]) -> Optional[Dict[str, Any]]:
-        if not isinstance(coverages, list):
-            return None
+    # Single pass: index the first coverage whose name matches each spec label
+    cov_by_label: Dict[str, Dict[str, Any]] = {}
+    if isinstance(coverages, list):
         for c in coverages:
             try:
                 n = str(c.get("nombre") or "").strip().upper()
-                for target in names:
-                    if target in n:
-                        return c
             except Exception:
                 continue
-        return None
+            for label, names, _ in _COVERAGE_SPECS:
+                if label not in cov_by_label and any(target in n for target in names):
+                    cov_by_label[label] = c
 
-    dm_cov = cov_by_name(["DAÑOS MATERIALES", "DANOS MATERIALES"]) or {}
-    if dm_cov:
-        monto = dm_cov.get("suma_asegurada")
-        ded = dm_cov.get("porcentaje_deducible")
-        if monto and ded not in (None, ""):
-            danos_materiales = f"${monto} Deducible {ded}%"
-        elif monto:
-            danos_materiales = f"${monto}"
-
-    rt_cov = cov_by_name(["ROBO TOTAL"]) or {}
-    if rt_cov:
-        monto = rt_cov.get("suma_asegurada")
-        ded = rt_cov.get("porcentaje_deducible")
-        if monto and ded not in (None, ""):
-            robo_total = f"${monto} Deducible {ded}%"
+    coverage_values: Dict[str, str] = {}
+    for label, _, with_deductible in _COVERAGE_SPECS:
+        cov = cov_by_label.get(label) or {}
+        monto = cov.get("suma_asegurada")
+        ded = cov.get("porcentaje_deducible")
+        if monto and with_deductible and ded not in (None, ""):
+            coverage_values[label] = f"${monto} Deducible {ded}%"
         elif monto:
-            robo_total = f"${monto}"
-
-    rc_cov = cov_by_name(["RESPONSABILIDAD CIVIL"]) or {}
-    if rc_cov:
-        monto = rc_cov.get("suma_asegurada")
-        if monto:
-            responsabilidad_civil = f"${monto}"
-
-    gmo_cov = cov_by_name(["GASTOS MEDICOS", "GASTOS MÉDICOS"]) or {}
-    if gmo_cov:
-        monto = gmo_cov.get("suma_asegurada")
-        if monto:
-            gmo = f"${monto}"
+            coverage_values[label] = f"${monto}"
+        else:
+            coverage_values[label] = "N/A"
 
     forma_pago = get_field("forma_de_pago", "forma_pago") or "CONTADO"
 
@@ -258,10 +538,7 @@ def _map_ade_to_result(ade: Dict[str, Any]) -> Dict[str, str]:
         "vehicle_name": vehicle_name,
         **fin,
         "Forma de Pago": forma_pago,
-        "Daños Materiales": danos_materiales,
-        "Robo Total": robo_total,
-        "Responsabilidad Civil": responsabilidad_civil,
-        "Gastos Medicos Ocupantes": gmo,
+        **coverage_values,
         "Asistencia Legal": asistencia_legal,
         "Asistencia Viajes": asistencia_viajes,
         "Accidente al conductor": acc_conductor,
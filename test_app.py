@@ -3,16 +3,146 @@
 Minimal tests for app initialization and routes.
 """
 
-import sys
-import os
-sys.path.append('.')
-
 from pdf_parser import parse_pdf
 
+# ADE body with every required top-level schema field filled in
+COMPLETE_ADE = {"data": {"extracted_schema": {
+    "company": "HDI Seguros", "session_info": {"date": "01/01/2026"},
+    "vehicle_info": {"vehicle_name": "X"}, "coverages": [{"nombre": "RT"}],
+    "summary": {"prima_total": "1"}}}}
+INCOMPLETE_ADE = {"data": {"extracted_schema": {"company": "HDI Seguros"}}}
+
+class FakeADEResponse:
+    """Minimal stand-in for a requests response from ADE."""
+    def __init__(self, status_code, body):
+        import json
+        self.status_code = status_code
+        self.content = json.dumps(body).encode()
+        self.text = self.content.decode()
+
+def _fake_ade_post(monkeypatch, responses):
+    """Serve responses from _ade_post; returns the list of calls.
+
+    ``responses`` is a list served in order, or a dict keyed by PDF bytes.
+    """
+    import pdf_parser
+    calls = []
+    def fake_post(endpoint, headers, data, pdf_content):
+        calls.append(pdf_content)
+        if isinstance(responses, dict):
+            return responses[pdf_content]
+        return responses[min(len(calls), len(responses)) - 1]
+    monkeypatch.setenv("LANDING_AI_API_KEY", "test")
+    monkeypatch.setattr(pdf_parser, "ADE_RETRY_BACKOFF", 0)
+    monkeypatch.setattr(pdf_parser, "_ade_post", fake_post)
+    return calls
+
 def test_noop_parser_import():
     """Ensure parse_pdf is importable (ADE-driven parser)."""
     assert callable(parse_pdf)
 
+def test_parse_pdf_caches_by_content(monkeypatch):
+    """Identical PDF bytes are only sent to ADE once."""
+    import pdf_parser
+    calls = []
+    def fake_extract(content):
+        calls.append(content)
+        return COMPLETE_ADE
+    monkeypatch.setattr(pdf_parser, "_ade_extract_unified", fake_extract)
+    first = pdf_parser.parse_pdf(b"%PDF-cache-test")
+    second = pdf_parser.parse_pdf(b"%PDF-cache-test")
+    assert first == second and first["company"] == "HDI Seguros"
+    assert len(calls) == 1
+
+def test_ade_retries_throttled_response(monkeypatch):
+    """A 429 is retried and the following complete response is used."""
+    import pdf_parser
+    monkeypatch.setattr(pdf_parser, "ADE_MAX_ATTEMPTS", 2)
+    calls = _fake_ade_post(monkeypatch, [FakeADEResponse(429, {}), FakeADEResponse(200, COMPLETE_ADE)])
+    assert pdf_parser._ade_extract_unified(b"%PDF-429-test") == COMPLETE_ADE
+    assert len(calls) == 2
+
+def test_ade_retry_respects_time_budget(monkeypatch):
+    """No retry is started when another request would overrun ADE_TOTAL_TIMEOUT."""
+    import pytest
+    import pdf_parser
+    monkeypatch.setattr(pdf_parser, "ADE_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(pdf_parser, "ADE_TOTAL_TIMEOUT", 0)
+    calls = _fake_ade_post(monkeypatch, [FakeADEResponse(429, {}), FakeADEResponse(200, COMPLETE_ADE)])
+    with pytest.raises(RuntimeError):
+        pdf_parser._ade_extract_unified(b"%PDF-budget-test")
+    assert len(calls) == 1
+
+def test_ade_retries_incomplete_extraction(monkeypatch):
+    """An extraction missing required fields is retried once."""
+    import pdf_parser
+    monkeypatch.setattr(pdf_parser, "ADE_MAX_ATTEMPTS", 2)
+    calls = _fake_ade_post(monkeypatch, [FakeADEResponse(200, INCOMPLETE_ADE),
+                                         FakeADEResponse(200, COMPLETE_ADE)])
+    assert pdf_parser._ade_extract_unified(b"%PDF-incomplete-test") == COMPLETE_ADE
+    assert len(calls) == 2
+
+def test_incomplete_result_not_memoized(monkeypatch):
+    """parse_pdf returns an incomplete extraction but asks ADE again next time."""
+    import pdf_parser
+    monkeypatch.setattr(pdf_parser, "ADE_MAX_ATTEMPTS", 1)
+    calls = _fake_ade_post(monkeypatch, [FakeADEResponse(200, INCOMPLETE_ADE)])
+    assert pdf_parser.parse_pdf(b"%PDF-no-memo-test")["company"] == "HDI Seguros"
+    assert pdf_parser.parse_pdf(b"%PDF-no-memo-test")["company"] == "HDI Seguros"
+    assert len(calls) == 2
+
+def test_extraction_disk_cache(monkeypatch, tmp_path):
+    """With EXTRACTION_CACHE_DIR set, ADE responses are reused from disk."""
+    import pdf_parser
+    calls = _fake_ade_post(monkeypatch, [FakeADEResponse(200, COMPLETE_ADE)])
+    monkeypatch.setattr(pdf_parser, "EXTRACTION_CACHE_DIR", str(tmp_path))
+    first = pdf_parser._ade_extract_unified(b"%PDF-disk-cache-test")
+    second = pdf_parser._ade_extract_unified(b"%PDF-disk-cache-test")
+    assert first == second and len(calls) == 1
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+def test_parse_pdfs_isolates_malformed_response(monkeypatch):
+    """A non-object ADE body fails only its own document in a batch."""
+    import pdf_parser
+    good = FakeADEResponse(200, INCOMPLETE_ADE)
+    _fake_ade_post(monkeypatch, {b"%PDF-good-1": good, b"%PDF-good-2": good,
+                                 b"%PDF-bad": FakeADEResponse(200, [1, 2])})
+    monkeypatch.setattr(pdf_parser, "ADE_MAX_ATTEMPTS", 1)
+    results = pdf_parser.parse_pdfs([b"%PDF-good-1", b"%PDF-bad", b"%PDF-good-2"])
+    assert results[1] is None
+    assert results[0]["company"] == results[2]["company"] == "HDI Seguros"
+
+def test_parse_pdfs_isolates_non_finite_amount(monkeypatch):
+    """An overflowing amount, or an unexpected error, fails only its own document."""
+    import copy
+    import pdf_parser
+    huge = copy.deepcopy(COMPLETE_ADE)
+    huge["data"]["extracted_schema"]["summary"]["prima_neta"] = "1e400"
+    _fake_ade_post(monkeypatch, {b"%PDF-ok": FakeADEResponse(200, COMPLETE_ADE),
+                                 b"%PDF-huge": FakeADEResponse(200, huge)})
+    results = pdf_parser.parse_pdfs([b"%PDF-ok", b"%PDF-huge"])
+    assert all(r and r["company"] == "HDI Seguros" for r in results)
+
+    original = pdf_parser._compute_financials
+    def overflowing(prima_neta_raw, *args):
+        if prima_neta_raw == "1e400":
+            raise OverflowError("cannot convert float infinity to integer")
+        return original(prima_neta_raw, *args)
+    monkeypatch.setattr(pdf_parser, "_compute_financials", overflowing)
+    monkeypatch.setattr(pdf_parser, "_PARSE_CACHE", type(pdf_parser._PARSE_CACHE)())
+    results = pdf_parser.parse_pdfs([b"%PDF-ok", b"%PDF-huge", b"%PDF-ok"])
+    assert results[1] is None
+    assert results[0]["company"] == results[2]["company"] == "HDI Seguros"
+
+def test_compute_financials_reconciles():
+    """IVA and Prima Total are exact to the cent."""
+    from pdf_parser import _compute_financials
+    fin = _compute_financials("12,345.60", None, "300", "650")
+    assert fin["IVA"] == "$2,127.30"
+    assert fin["Prima Total"] == "$15,422.90"
+    assert _compute_financials(None, "999", None, None)["Prima Neta"] == "N/A"
+    assert _compute_financials("inf", "1e400", "nan", None)["Prima Total"] == "N/A"
+
 def test_flask_app():
     """Test Flask app creation."""
     print("Testing Flask App...")
@@ -31,6 +161,69 @@ def test_flask_app():
     
     print()
 
+def test_brand_detection():
+    """Company names map to a single normalized brand key."""
+    from app import _brand_of
+    assert _brand_of("Quálitas Compañía de Seguros") == "QUALITAS"
+    assert _brand_of("ANA Seguros") == "ANA"
+    assert _brand_of("Seguros Atlas") == "ATLAS"
+    assert _brand_of("Mexicana de Seguros") is None
+
+def test_export_token_roundtrip(monkeypatch, tmp_path):
+    """Staged export payloads are retrievable once by token."""
+    import app as app_module
+    from app import app, _pop_export
+    monkeypatch.setattr(app_module, "EXPORT_STORE_DIR", str(tmp_path))
+    client = app.test_client()
+    resp = client.post('/export', json={"data": [{"company": "HDI"}], "meta": {}})
+    assert resp.status_code == 200
+    token = resp.get_json()["token"]
+    assert _pop_export(token)["data"][0]["company"] == "HDI"
+    assert _pop_export(token) is None
+    assert client.post('/export', json={"data": "nope"}).status_code == 400
+    resp = client.post('/export', json={"data": [{"company": "HDI"}], "view_token": 123})
+    assert resp.status_code == 200
+
+def test_export_store_is_private(monkeypatch, tmp_path):
+    """Staged exports live in a 0700 directory as 0600 files."""
+    import stat
+    import app as app_module
+    store = tmp_path / "exports"
+    monkeypatch.setattr(app_module, "EXPORT_STORE_DIR", str(store))
+    token = app_module._stash_export({"data": []})
+    assert stat.S_IMODE(store.stat().st_mode) == 0o700
+    assert stat.S_IMODE((store / f"{token}.json").stat().st_mode) == 0o600
+
+def test_export_reuses_process_view(monkeypatch, tmp_path):
+    """Colors/logos stashed by process_files are attached to the export."""
+    import app as app_module
+    from app import app, _stash_export, _pop_export
+    monkeypatch.setattr(app_module, "EXPORT_STORE_DIR", str(tmp_path))
+    view_token = _stash_export({"header_colors": ["#006729"], "brands": ["HDI"]})
+    resp = app.test_client().post('/export', json={"data": [{"company": "HDI"}], "view_token": view_token})
+    payload = _pop_export(resp.get_json()["token"])
+    assert payload["header_colors"] == ["#006729"]
+
+def test_export_pdf_leaves_no_temp_file(monkeypatch, tmp_path):
+    """Exports are rendered in memory; nothing is left in the temp dir."""
+    import tempfile
+    import app as app_module
+    class FakeHTML:
+        def __init__(self, string):
+            pass
+        def write_pdf(self, target=None, **kwargs):
+            assert target is None
+            return b"%PDF-fake"
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.setattr(app_module, "EXPORT_STORE_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(app_module, "PDF_BACKEND", "weasyprint")
+    monkeypatch.setattr(app_module, "WEASYPRINT_AVAILABLE", True)
+    monkeypatch.setattr(app_module, "_WPHTML", FakeHTML)
+    token = app_module._stash_export({"data": [{"company": "HDI"}], "meta": {}})
+    resp = app_module.app.test_client().get(f'/export/{token}')
+    assert resp.status_code == 200 and resp.data == b"%PDF-fake"
+    assert not list(tmp_path.glob("*.pdf"))
+
 def main():
     """Run all tests."""
     print("Insurance PDF Parser Test Suite")